@@ -25,27 +25,41 @@ CREATE TABLE IF NOT EXISTS conversations (
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Create index on chat_id for better performance
-CREATE INDEX IF NOT EXISTS idx_conversations_chat_id ON conversations(chat_id);
+-- Composite index so "latest N turns of a chat" is a bounded index scan with no sort
+CREATE INDEX IF NOT EXISTS ix_conversations_chat_ts ON conversations(chat_id, timestamp DESC);
 CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations(timestamp);
 
--- Create business_knowledge table with vector column
+-- Create business_knowledge table with half-precision vector column
 CREATE TABLE IF NOT EXISTS business_knowledge (
     id SERIAL PRIMARY KEY,
     content TEXT NOT NULL,
-    embedding vector(1536),
+    embedding halfvec(1536),
     meta_data JSONB,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Create vector index for similarity search
--- Note: We'll create this index later when we have some data
--- CREATE INDEX business_knowledge_embedding_idx ON business_knowledge 
--- USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+-- Create HNSW vector index for similarity search (no training data needed, unlike IVFFlat)
+CREATE INDEX IF NOT EXISTS business_knowledge_embedding_hnsw_idx ON business_knowledge
+USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64);
 
 -- Create index on created_at for better performance
 CREATE INDEX IF NOT EXISTS idx_business_knowledge_created_at ON business_knowledge(created_at);
 
+-- Create response_cache table for semantic caching of agent responses
+CREATE TABLE IF NOT EXISTS response_cache (
+    id SERIAL PRIMARY KEY,
+    embedding vector(1536) NOT NULL,
+    context_hash VARCHAR(64) NOT NULL,
+    response TEXT NOT NULL,
+    tools_used JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_response_cache_expires_at ON response_cache(expires_at);
+-- Lookups filter by context_hash and compare distances over the few matching rows
+CREATE INDEX IF NOT EXISTS ix_response_cache_context_hash ON response_cache(context_hash);
+
 -- Insert some sample business knowledge
 INSERT INTO business_knowledge (content, meta_data) VALUES 
 (
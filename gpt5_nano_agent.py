@@ -1,28 +1,49 @@
 #!/usr/bin/env python3
 """Alternative agent implementation for gpt-5-nano using direct tool calling."""
 
-import os
+import asyncio
+from collections.abc import AsyncIterator
 from typing import Any
 
 from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage, ToolMessage
 from langchain_openai import ChatOpenAI
 
+from llm import get_chat_model
 from tools import check_property_availability, get_property_details, list_available_properties
 
 load_dotenv()
 
+SYSTEM_PROMPT = (
+    "You are a helpful WhatsApp assistant for an Airbnb property management company in Miami.\n\n"
+    "You MUST use the provided tools to answer questions about properties:\n"
+    "- check_property_availability: Check if a property is available for specific dates\n"
+    "- get_property_details: Get detailed information about a property\n"
+    "- list_available_properties: List all available properties\n\n"
+    "Guidelines:\n"
+    "- ALWAYS use tools when users ask about properties, availability, or details\n"
+    "- Be friendly and conversational, like a WhatsApp chat\n"
+    "- Keep responses concise but informative\n"
+    "- Use emojis appropriately for WhatsApp style\n"
+    "- Reply in Spanish, turning tool results into a friendly final answer for the user\n"
+    "- Do not make up property information - use the tools"
+)
+
+MAX_TOOL_ROUNDS = 3
+
+FALLBACK_RESPONSE = "Lo siento, no pude completar tu solicitud. ¿Puedes intentarlo de nuevo? 🙏"
+
 
 class GPT5NanoAgent:
     """Custom agent that works with gpt-5-nano using direct tool calling."""
 
-    def __init__(self):
-        """Initialize the GPT-5-nano agent with tools and configuration."""
-        self.llm = ChatOpenAI(
-            model="gpt-5-nano",
-            temperature=0.1,
-            openai_api_key=os.getenv("OPENAI_API_KEY"),
-        )
+    def __init__(self, llm: ChatOpenAI | None = None):
+        """Initialize the GPT-5-nano agent with tools and configuration.
+
+        Args:
+            llm: Pre-built chat model to use; defaults to the shared gpt-5-nano client
+        """
+        self.llm = llm or get_chat_model("gpt-5-nano")
 
         self.tools = [
             check_property_availability,
@@ -30,78 +51,101 @@ class GPT5NanoAgent:
             list_available_properties,
         ]
 
+        self.tools_by_name = {tool.name: tool for tool in self.tools}
         self.llm_with_tools = self.llm.bind_tools(self.tools)
+        # Used for the call after the last tool round so the model has to answer in text
+        self.llm_final = self.llm.bind_tools(self.tools, tool_choice="none")
+
+        self.system_prompt = SYSTEM_PROMPT
 
-        self.system_prompt = (
-            "You are a helpful WhatsApp assistant for an Airbnb property management company in Miami.\n\n"
-            "You MUST use the provided tools to answer questions about properties:\n"
-            "- check_property_availability: Check if a property is available for specific dates\n"
-            "- get_property_details: Get detailed information about a property\n"
-            "- list_available_properties: List all available properties\n\n"
-            "Guidelines:\n"
-            "- ALWAYS use tools when users ask about properties, availability, or details\n"
-            "- Be friendly and conversational, like a WhatsApp chat\n"
-            "- Keep responses concise but informative\n"
-            "- Use emojis appropriately for WhatsApp style\n"
-            "- Do not make up property information - use the tools"
-        )
-
-    def process_message(
+    def _build_messages(self, message: str, business_context: str, conversation_history: str) -> list[BaseMessage]:
+        """Build the prompt with the static system prompt first so its prefix can be cached."""
+        return [
+            SystemMessage(content=self.system_prompt),
+            SystemMessage(content=f"Business Context:\n{business_context}"),
+            HumanMessage(content=f"Conversation History:\n{conversation_history}\n\nUser message: {message}"),
+        ]
+
+    async def _run_tool_calls(self, messages: list[BaseMessage], response: AIMessage, tools_used: list[str]) -> None:
+        """Execute the tool calls requested by ``response`` and append their results to ``messages``."""
+        messages.append(response)
+        for tool_call in response.tool_calls:
+            tool_name = tool_call["name"]
+            tool_func = self.tools_by_name.get(tool_name)
+
+            if tool_func is None:
+                content = f"Unknown tool {tool_name}"
+            else:
+                try:
+                    content = str(await tool_func.ainvoke(tool_call["args"]))
+                    tools_used.append(tool_name)
+                except Exception as e:
+                    content = f"Tool {tool_name} error: {str(e)}"
+
+            messages.append(ToolMessage(content=content, tool_call_id=tool_call["id"]))
+
+    async def process_message(
         self, message: str, business_context: str = "", conversation_history: str = ""
     ) -> dict[str, Any]:
         """Process a message and return response with tool usage info."""
-        full_prompt = f"""{self.system_prompt}
-
-Business Context:
-{business_context}
-
-Conversation History:
-{conversation_history}
+        messages = self._build_messages(message, business_context, conversation_history)
 
-User message: {message}"""
+        tools_used: list[str] = []
+        response = await self.llm_with_tools.ainvoke(messages)
 
-        response = self.llm_with_tools.invoke([HumanMessage(content=full_prompt)])
+        for round_number in range(1, MAX_TOOL_ROUNDS + 1):
+            if not getattr(response, "tool_calls", None):
+                break
 
-        tools_used = []
-        final_response = response.content
+            await self._run_tool_calls(messages, response, tools_used)
+            llm = self.llm_final if round_number == MAX_TOOL_ROUNDS else self.llm_with_tools
+            response = await llm.ainvoke(messages)
 
-        if hasattr(response, "tool_calls") and response.tool_calls:
-            tool_results = []
+        final_response = response.content or FALLBACK_RESPONSE
 
-            for tool_call in response.tool_calls:
-                tool_name = tool_call["name"]
-                tool_args = tool_call["args"]
+        return {"response": final_response, "tools_used": tools_used, "success": bool(response.content)}
 
-                tool_func = None
-                for tool in self.tools:
-                    if tool.name == tool_name:
-                        tool_func = tool
-                        break
+    async def stream_message(
+        self,
+        message: str,
+        business_context: str = "",
+        conversation_history: str = "",
+        tools_used: list[str] | None = None,
+    ) -> AsyncIterator[str]:
+        """Stream the response text as it is generated, running tool calls between rounds.
 
-                if tool_func:
-                    try:
-                        result = tool_func.invoke(tool_args)
-                        tool_results.append(f"Tool {tool_name} result: {result}")
-                        tools_used.append(tool_name)
-                    except Exception as e:
-                        tool_results.append(f"Tool {tool_name} error: {str(e)}")
+        Args:
+            message: Incoming user message
+            business_context: Relevant business knowledge for the prompt
+            conversation_history: Formatted previous conversation turns
+            tools_used: Optional list that receives the names of the tools called
 
-            if tool_results:
-                final_prompt = f"""Based on the following tool results, provide a final helpful response to the user.
+        Yields:
+            Response text chunks
+        """
+        messages = self._build_messages(message, business_context, conversation_history)
+        tools_used = [] if tools_used is None else tools_used
 
-Original user message: {message}
-Tool results:
-{chr(10).join(tool_results)}
+        streamed_text = False
+        for round_number in range(MAX_TOOL_ROUNDS + 1):
+            llm = self.llm_final if round_number == MAX_TOOL_ROUNDS else self.llm_with_tools
+            response: AIMessageChunk | None = None
+            async for chunk in llm.astream(messages):
+                if chunk.content:
+                    streamed_text = True
+                    yield chunk.content
+                response = chunk if response is None else response + chunk
 
-Provide a friendly, conversational response in Spanish with appropriate emojis:"""
+            if response is None or not response.tool_calls:
+                break
 
-                final_response_msg = self.llm.invoke([HumanMessage(content=final_prompt)])
-                final_response = final_response_msg.content
+            await self._run_tool_calls(messages, response, tools_used)
 
-        return {"response": final_response, "tools_used": tools_used, "success": True}
+        if not streamed_text:
+            yield FALLBACK_RESPONSE
 
 
-def test_gpt5_nano_agent():
+async def test_gpt5_nano_agent():
     """Test the custom gpt-5-nano agent."""
     print("🧪 Testing custom GPT-5-nano agent...")
 
@@ -113,19 +157,23 @@ def test_gpt5_nano_agent():
         "Dame detalles de la propiedad brickell_03",
     ]
 
-    for i, message in enumerate(test_messages, 1):
+    results = await asyncio.gather(
+        *(agent.process_message(message) for message in test_messages), return_exceptions=True
+    )
+
+    for i, (message, result) in enumerate(zip(test_messages, results, strict=True), 1):
         print(f"\n=== Test {i}: {message} ===")
-        try:
-            result = agent.process_message(message)
-            print(f"✅ Success: {result['success']}")
-            print(f"🔧 Tools used: {result['tools_used']}")
-            print(f"📝 Response: {result['response'][:150]}...")
-        except Exception as e:
-            print(f"❌ Error: {e}")
+        if isinstance(result, BaseException):
+            print(f"❌ Error: {result}")
             import traceback
 
-            traceback.print_exc()
+            traceback.print_exception(result)
+            continue
+
+        print(f"✅ Success: {result['success']}")
+        print(f"🔧 Tools used: {result['tools_used']}")
+        print(f"📝 Response: {result['response'][:150]}...")
 
 
 if __name__ == "__main__":
-    test_gpt5_nano_agent()
+    asyncio.run(test_gpt5_nano_agent())
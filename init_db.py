@@ -1,49 +1,65 @@
 #!/usr/bin/env python3
 """Initialize database for WhatsApp AI Assistant."""
 
+import asyncio
 import sys
-import time
 
 from dotenv import load_dotenv
+from sqlalchemy import make_url, text
 
-from database import init_database, test_connection
+from database import get_database_url, get_session, init_database, test_connection
 from vector_store import BusinessKnowledgeStore, init_sample_knowledge
 
 load_dotenv()
 
 
-def check_postgres() -> bool:
+async def wait_for_port(host: str, port: int, attempts: int = 30) -> bool:
+    """Wait for a TCP port to accept connections, backing off exponentially."""
+    delay = 0.1
+    for attempt in range(attempts):
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=1)
+            writer.close()
+            await writer.wait_closed()
+            return True
+        except (OSError, TimeoutError) as e:
+            print(f"⏳ Attempt {attempt + 1}/{attempts}: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.7, 2.0)
+    return False
+
+
+async def check_postgres() -> bool:
     """Check if PostgreSQL is ready."""
     print("🔍 Checking PostgreSQL connection...")
 
-    for attempt in range(10):
-        try:
-            result = test_connection()
-            if result["status"] == "connected":
-                print(f"✅ PostgreSQL connected: {result['current_time']}")
-                return True
-        except Exception as e:
-            print(f"⏳ Attempt {attempt + 1}/10: {e}")
-            time.sleep(2)
+    url = make_url(get_database_url())
+    if await wait_for_port(url.host or "localhost", url.port or 5432):
+        result = await test_connection()
+        if result["status"] == "connected":
+            print(f"✅ PostgreSQL connected: {result['current_time']}")
+            return True
+        print(f"❌ {result['message']}")
 
     print("❌ PostgreSQL not available")
     return False
 
 
-def init_all() -> bool:
+async def init_all() -> bool:
     """Initialize database, tables, and sample data."""
     try:
         print("🔄 Creating tables...")
-        init_database()
+        await init_database()
         print("✅ Tables created")
 
         print("🔄 Setting up vector store...")
         store = BusinessKnowledgeStore()
-        store.setup_vector_extension()
+        await store.setup_vector_extension()
+        await store.create_vector_index()
         print("✅ Vector store ready")
 
         print("🔄 Adding sample data...")
-        init_sample_knowledge()
+        await init_sample_knowledge()
         print("✅ Sample data added")
 
         return True
@@ -52,43 +68,38 @@ def init_all() -> bool:
         return False
 
 
-def verify_data() -> bool:
+async def verify_data() -> bool:
     """Verify data was inserted correctly."""
     try:
         print("🔍 Verifying data...")
-        from database import get_session
-
-        session = get_session()
-
-        from sqlalchemy import text
 
-        conv_count = session.execute(text("SELECT COUNT(*) FROM conversations")).fetchone()[0]
-        print(f"📊 Conversations: {conv_count} records")
+        async with get_session() as session:
+            conv_count = await session.scalar(text("SELECT COUNT(*) FROM conversations"))
+            print(f"📊 Conversations: {conv_count} records")
 
-        bk_count = session.execute(text("SELECT COUNT(*) FROM business_knowledge")).fetchone()[0]
-        print(f"📊 Business knowledge: {bk_count} records")
+            bk_count = await session.scalar(text("SELECT COUNT(*) FROM business_knowledge"))
+            print(f"📊 Business knowledge: {bk_count} records")
 
-        session.close()
         return bk_count > 0
     except Exception as e:
         print(f"❌ Verification error: {e}")
         return False
 
 
-def main():
+async def main():
     """Main function."""
     print("🚀 Database Initialization")
     print("=" * 30)
 
-    if not check_postgres():
+    if not await check_postgres():
         print("\n💡 Start PostgreSQL first:")
         print("   docker-compose up -d")
         return 1
 
-    if not init_all():
+    if not await init_all():
         return 1
 
-    if not verify_data():
+    if not await verify_data():
         print("⚠️  Data verification failed")
         return 1
 
@@ -98,4 +109,4 @@ def main():
 
 
 if __name__ == "__main__":
-    sys.exit(main())
+    sys.exit(asyncio.run(main()))
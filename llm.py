@@ -0,0 +1,148 @@
+"""Shared OpenAI clients for WhatsApp AI Agent."""
+
+import asyncio
+import os
+from functools import cache
+
+import httpx
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+load_dotenv()
+
+_http_async_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared keep-alive HTTP pool, creating it if it does not exist or was closed."""
+    global _http_async_client
+    if _http_async_client is None or _http_async_client.is_closed:
+        _http_async_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            timeout=60,
+        )
+    return _http_async_client
+
+
+def get_api_key() -> str:
+    """Get the OpenAI API key from the environment."""
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY environment variable is required")
+    return api_key
+
+
+@cache
+def get_chat_model(model: str, temperature: float = 0.1) -> ChatOpenAI:
+    """Return a cached chat model that reuses the shared keep-alive HTTP pool."""
+    return ChatOpenAI(
+        openai_api_key=get_api_key(),
+        model=model,
+        temperature=temperature,
+        http_async_client=get_http_client(),
+    )
+
+
+@cache
+def get_embeddings(model: str) -> OpenAIEmbeddings:
+    """Return a cached embeddings client that reuses the shared keep-alive HTTP pool."""
+    return OpenAIEmbeddings(model=model, http_async_client=get_http_client())
+
+
+class EmbedBatcher:
+    """Coalesces concurrent embedding requests into batched embeddings API calls."""
+
+    def __init__(self, embeddings: OpenAIEmbeddings, max_batch_size: int = 256, max_wait: float = 0.005):
+        """Initialize the batcher.
+
+        Args:
+            embeddings: Embeddings client used to embed each batch
+            max_batch_size: Maximum number of texts sent in one API call
+            max_wait: Seconds to wait for more texts after the first one arrives
+        """
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: asyncio.Queue[tuple[str, asyncio.Future[list[float]]]] = asyncio.Queue()
+        self._worker: asyncio.Task[None] | None = None
+        self._flushes: set[asyncio.Task[None]] = set()
+
+    async def embed(self, text: str) -> list[float]:
+        """Embed a single text, sharing the API call with other concurrent requests."""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+        future: asyncio.Future[list[float]] = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self) -> None:
+        """Collect queued texts into batches and dispatch them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            try:
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                self._fail(batch)
+                raise
+
+            flush = asyncio.create_task(self._flush(batch))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: list[tuple[str, asyncio.Future[list[float]]]]) -> None:
+        """Embed a batch and resolve the waiting futures."""
+        try:
+            vectors = await self.embeddings.aembed_documents([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), vector in zip(batch, vectors, strict=True):
+            if not future.done():
+                future.set_result(vector)
+
+    def _fail(self, batch: list[tuple[str, asyncio.Future[list[float]]]]) -> None:
+        """Fail the futures of texts that will never be embedded."""
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(RuntimeError("EmbedBatcher is closed"))
+
+    async def aclose(self) -> None:
+        """Stop the background batching task, fail queued texts and wait for in-flight batches."""
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+        queued = []
+        while not self._queue.empty():
+            queued.append(self._queue.get_nowait())
+        self._fail(queued)
+
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP connection pool and drop the cached clients that use it.
+
+    The next get_chat_model or get_embeddings call builds fresh clients on a new pool, so the
+    application can start again in the same process.
+    """
+    global _http_async_client
+    get_chat_model.cache_clear()
+    get_embeddings.cache_clear()
+    if _http_async_client is not None:
+        await _http_async_client.aclose()
+        _http_async_client = None
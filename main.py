@@ -1,28 +1,103 @@
 """FastAPI application with LangChain AI Agent for WhatsApp message responses."""
 
+import asyncio
+import hashlib
+import json
 import os
-from typing import Any
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Annotated, Any
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, Form, HTTPException, Response
+from fastapi import Depends, FastAPI, Form, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.caches import InMemoryCache
+from langchain_core.globals import set_llm_cache
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from twilio.twiml.messaging_response import MessagingResponse
 
-from database import init_database, test_connection
+from database import engine, get_chat_context, get_db, init_database, test_connection
 from gpt5_nano_agent import GPT5NanoAgent
-from memory import ConversationMemory
+from llm import close_http_client, get_chat_model
+from memory import CONTEXT_CACHE_TURNS, ConversationMemory, cache_turns, format_conversation_context, get_cached_turns
+from response_cache import ResponseCache
 from tools import check_property_availability, get_property_details, list_available_properties
 from vector_store import BusinessKnowledgeStore
 
 load_dotenv()
 
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+
+AGENT_TOOLS = [
+    check_property_availability,
+    get_property_details,
+    list_available_properties,
+]
+
+AGENT_SYSTEM_PROMPT = """You are a helpful WhatsApp assistant for an Airbnb property management company in Miami.
+
+You MUST use the provided tools to answer questions about properties:
+- check_property_availability: Check if a property is available for specific dates
+- get_property_details: Get detailed information about a property
+- list_available_properties: List all available properties
+
+Guidelines:
+- ALWAYS use tools when users ask about properties, availability, or details
+- Be friendly and conversational, like a WhatsApp chat
+- Keep responses concise but informative
+- Use emojis appropriately for WhatsApp style
+- Do not make up property information - use the tools"""
+
+AGENT_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", AGENT_SYSTEM_PROMPT),
+        ("system", "Business Context:\n{business_context}"),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("human", "Conversation History:\n{conversation_history}\n\nUser message: {input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad"),
+    ]
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Initialize the database and shared agents on startup and release the connection pool on shutdown."""
+    try:
+        app.state.llm = get_llm()
+    except ValueError as e:
+        # Keep serving /health and /db-status so the missing key is reported instead of failing startup
+        print(f"⚠️ LLM client not initialized: {e}")
+        app.state.llm = None
+    set_llm_cache(InMemoryCache(maxsize=int(os.getenv("LLM_CACHE_SIZE", "1000"))))
+
+    print("🚀 Initializing database...")
+    await init_database()
+    print("✅ Database ready!")
+
+    app.state.response_cache = ResponseCache()
+    if app.state.llm is not None:
+        app.state.knowledge_store = BusinessKnowledgeStore()
+        if OPENAI_MODEL == "gpt-5-nano":
+            app.state.gpt5_agent = GPT5NanoAgent(app.state.llm)
+        else:
+            app.state.agent_executor = create_agent()
+    yield
+    if app.state.llm is not None:
+        await app.state.knowledge_store.embed_batcher.aclose()
+    await app.state.response_cache.aclose()
+    await engine.dispose()
+    await close_http_client()
+
+
 app = FastAPI(
     title="WhatsApp AI Agent",
     description="AI Agent with memory, vector store, and tools for Airbnb property management",
     version="2.0.0",
+    lifespan=lifespan,
 )
 
 
@@ -44,58 +119,168 @@ class AgentResponse(BaseModel):
     success: bool
 
 
-def get_llm():
-    """Initialize and return the LangChain OpenAI model."""
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY environment variable is required")
-
-    model = os.getenv("OPENAI_MODEL", "gpt-4o")
-    return ChatOpenAI(openai_api_key=api_key, model=model, temperature=0.1)
+def get_llm() -> ChatOpenAI:
+    """Return the shared LangChain OpenAI model."""
+    return get_chat_model(OPENAI_MODEL)
 
 
 def create_agent() -> AgentExecutor:
     """Create the AI agent with tools and memory."""
-    llm = get_llm()
+    agent = create_openai_functions_agent(get_llm(), AGENT_TOOLS, AGENT_PROMPT)
+    return AgentExecutor(
+        agent=agent,
+        tools=AGENT_TOOLS,
+        verbose=os.getenv("DEBUG", "false").lower() == "true",
+        return_intermediate_steps=True,
+        # Plan with ainvoke rather than astream so model calls go through the exact-match LLM cache
+        stream_runnable=False,
+    )
 
-    tools = [
-        check_property_availability,
-        get_property_details,
-        list_available_properties,
-    ]
 
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                """You are a helpful WhatsApp assistant for an Airbnb property management company in Miami.
+_inflight: dict[str, asyncio.Future[tuple[str, list[str]]]] = {}
 
-You MUST use the provided tools to answer questions about properties:
-- check_property_availability: Check if a property is available for specific dates
-- get_property_details: Get detailed information about a property  
-- list_available_properties: List all available properties
 
-Guidelines:
-- ALWAYS use tools when users ask about properties, availability, or details
-- Be friendly and conversational, like a WhatsApp chat
-- Keep responses concise but informative
-- Use emojis appropriately for WhatsApp style
-- Do not make up property information - use the tools
-
-Business Context:
-{business_context}
-
-Conversation History:
-{conversation_history}""",
-            ),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ]
-    )
+async def run_agent(user_message: str, business_context: str, conversation_history: str) -> tuple[str, list[str]]:
+    """Invoke the configured agent and return the response text and tools used."""
+    if OPENAI_MODEL == "gpt-5-nano":
+        result = await app.state.gpt5_agent.process_message(
+            user_message, business_context=business_context, conversation_history=conversation_history
+        )
+        return result["response"], result["tools_used"]
+
+    agent_input = {
+        "input": user_message,
+        "business_context": business_context,
+        "conversation_history": conversation_history,
+        "chat_history": [],
+    }
+
+    result = await app.state.agent_executor.ainvoke(agent_input)
+    intermediate_steps = result.get("intermediate_steps", [])
+    tools_used = []
+    for step in intermediate_steps:
+        if len(step) >= 1 and hasattr(step[0], "tool"):
+            tools_used.append(step[0].tool)
+        elif len(step) >= 1 and hasattr(step[0], "name"):
+            tools_used.append(step[0].name)
+    return result["output"], tools_used
+
+
+async def run_agent_coalesced(
+    user_message: str, business_context: str, conversation_history: str
+) -> tuple[str, list[str]]:
+    """Run the agent, sharing a single in-flight call between identical concurrent prompts."""
+    key = hashlib.sha256(
+        f"{OPENAI_MODEL}|{business_context}|{conversation_history}|{user_message}".encode()
+    ).hexdigest()
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(run_agent(user_message, business_context, conversation_history))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+
+    return await asyncio.shield(task)
+
+
+async def stream_agent(
+    user_message: str, business_context: str, conversation_history: str, tools_used: list[str]
+) -> AsyncIterator[str]:
+    """Stream the configured agent's response text, recording the tools it calls in ``tools_used``."""
+    if OPENAI_MODEL == "gpt-5-nano":
+        async for token in app.state.gpt5_agent.stream_message(
+            user_message,
+            business_context=business_context,
+            conversation_history=conversation_history,
+            tools_used=tools_used,
+        ):
+            yield token
+        return
+
+    agent_input = {
+        "input": user_message,
+        "business_context": business_context,
+        "conversation_history": conversation_history,
+        "chat_history": [],
+    }
+
+    streamed_text = False
+    async for event in app.state.agent_executor.astream_events(agent_input, version="v2"):
+        if event["event"] == "on_chat_model_stream" and event["data"]["chunk"].content:
+            streamed_text = True
+            yield event["data"]["chunk"].content
+        elif event["event"] == "on_tool_start":
+            tools_used.append(event["name"])
+        elif event["event"] == "on_chain_end" and not event["parent_ids"] and not streamed_text:
+            # Answers served from the LLM cache produce no token events, so send the final output whole
+            yield event["data"]["output"]["output"]
+
+
+async def load_chat_context(chat_id: str, user_message: str) -> tuple[list[float], dict[str, Any] | None, str, str]:
+    """Embed a user message and fetch its cached response, business knowledge and conversation history.
+
+    Args:
+        chat_id: Conversation identifier
+        user_message: Incoming message text
+
+    Returns:
+        Tuple of the query embedding, the cached response (or None), the business context
+        and the formatted conversation history
+    """
+    if app.state.llm is None:
+        raise RuntimeError("LLM client not initialized")
 
-    agent = create_openai_functions_agent(llm, tools, prompt)
-    return AgentExecutor(agent=agent, tools=tools, verbose=True, return_intermediate_steps=True)
+    knowledge_store: BusinessKnowledgeStore = app.state.knowledge_store
+    response_cache: ResponseCache = app.state.response_cache
+
+    query_embedding = await knowledge_store.embed_batcher.embed(user_message)
+    recent_messages = get_cached_turns(chat_id)
+    limit_hist = 0 if recent_messages is not None else CONTEXT_CACHE_TURNS
+    history, relevant_knowledge = await get_chat_context(chat_id, query_embedding, limit_hist=limit_hist, limit_kb=3)
+
+    if recent_messages is None:
+        recent_messages = history
+        cache_turns(chat_id, history)
+
+    business_context = "\n".join([item["content"] for item in relevant_knowledge])
+    conversation_history = format_conversation_context(recent_messages)
+    cached = await response_cache.lookup(query_embedding, business_context, conversation_history)
+    return query_embedding, cached, business_context, conversation_history
+
+
+async def process_chat_message(
+    chat_id: str, user_message: str, session: AsyncSession | None = None
+) -> tuple[str, list[str]]:
+    """Answer a user message with the configured agent and store the turn in memory.
+
+    Semantically similar messages asked in the same context are answered from the response cache
+    without calling the LLM.
+
+    Args:
+        chat_id: Conversation identifier
+        user_message: Incoming message text
+        session: Request-scoped session used to store the turn
+
+    Returns:
+        Tuple of the response text and the names of the tools used
+    """
+    memory = ConversationMemory(chat_id, session)
+    response_cache: ResponseCache = app.state.response_cache
+
+    query_embedding, cached, business_context, conversation_history = await load_chat_context(chat_id, user_message)
+
+    if cached:
+        response_text = cached["response"]
+        tools_used = cached["tools_used"]
+    else:
+        response_text, tools_used = await run_agent_coalesced(user_message, business_context, conversation_history)
+
+        response_cache.schedule_store(
+            query_embedding, business_context, conversation_history, response_text, tools_used
+        )
+
+    await memory.add_message(user_message, response_text)
+    return response_text, tools_used
 
 
 @app.get("/")
@@ -106,79 +291,43 @@ async def root() -> dict[str, str]:
         "status": "active",
         "version": "2.0.0",
         "features": "memory, vector_store, tools, twilio_webhook",
-        "endpoints": "/chat, /health, /db-status, /webhook/twilio",
+        "endpoints": "/chat, /chat/stream, /health, /db-status, /webhook/twilio",
     }
 
 
 @app.get("/health")
 async def health_check() -> dict[str, str]:
     """Health check endpoint."""
-    try:
-        get_llm()
-        return {"status": "healthy", "openai": "connected", "agent": "ready"}
-    except Exception as e:
-        return {"status": "unhealthy", "error": str(e)}
+    llm: ChatOpenAI | None = getattr(app.state, "llm", None)
+    if llm is None:
+        return {"status": "unhealthy", "error": "LLM client not initialized"}
+    return {"status": "healthy", "openai": "connected", "agent": "ready", "model": llm.model_name}
 
 
 @app.get("/db-status")
 async def database_status() -> dict[str, Any]:
     """Check database connection status."""
-    return test_connection()
+    return await test_connection()
 
 
 @app.post("/chat", response_model=AgentResponse)
-async def chat_with_agent(message: ChatMessage) -> AgentResponse:
+async def chat_with_agent(message: ChatMessage, session: Annotated[AsyncSession, Depends(get_db)]) -> AgentResponse:
     """Main endpoint to process messages with the AI agent.
 
     Args:
         message: ChatMessage containing the user's message and chat_id
+        session: Request-scoped database session
 
     Returns:
         AgentResponse with the agent's response and metadata
     """
     try:
-        memory: ConversationMemory = ConversationMemory(message.chat_id)
-        knowledge_store: BusinessKnowledgeStore = BusinessKnowledgeStore()
-
-        conversation_history = memory.build_conversation_context(limit=5)
-        relevant_knowledge = knowledge_store.search_knowledge(message.message, limit=3)
-        business_context = "\n".join([item["content"] for item in relevant_knowledge])
-
-        model_name = os.getenv("OPENAI_MODEL", "gpt-4o")
-
-        if model_name == "gpt-5-nano":
-            gpt5_agent = GPT5NanoAgent()
-            result = gpt5_agent.process_message(
-                message.message, business_context=business_context, conversation_history=conversation_history
-            )
-            response_text = result["response"]
-            tools_used = result["tools_used"]
-        else:
-            agent_executor = create_agent()
-
-            agent_input = {
-                "input": message.message,
-                "business_context": business_context,
-                "conversation_history": conversation_history,
-                "chat_history": [],
-            }
-
-            result = agent_executor.invoke(agent_input)
-            response_text = result["output"]
-            intermediate_steps = result.get("intermediate_steps", [])
-            tools_used = []
-            for step in intermediate_steps:
-                if len(step) >= 1 and hasattr(step[0], "tool"):
-                    tools_used.append(step[0].tool)
-                elif len(step) >= 1 and hasattr(step[0], "name"):
-                    tools_used.append(step[0].name)
-
-        memory.add_message(message.message, response_text)
+        response_text, tools_used = await process_chat_message(message.chat_id, message.message, session=session)
 
         return AgentResponse(
             response=response_text,
             chat_id=message.chat_id,
-            model_used=model_name,
+            model_used=OPENAI_MODEL,
             tools_used=tools_used,
             success=True,
         )
@@ -187,13 +336,68 @@ async def chat_with_agent(message: ChatMessage) -> AgentResponse:
         raise HTTPException(status_code=500, detail=f"Error processing message: {str(e)}") from e
 
 
+def format_sse(payload: dict[str, Any]) -> str:
+    """Encode a payload as a server-sent event."""
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@app.post("/chat/stream")
+async def stream_chat_with_agent(message: ChatMessage) -> StreamingResponse:
+    """Stream the agent's response as server-sent events while it is generated.
+
+    Each event carries a JSON payload: ``{"token": ...}`` for response text chunks, then a final
+    ``{"done": true, "tools_used": [...], "model_used": ...}`` once the turn has been stored.
+
+    Args:
+        message: ChatMessage containing the user's message and chat_id
+
+    Returns:
+        StreamingResponse emitting ``text/event-stream`` events
+    """
+    try:
+        query_embedding, cached, business_context, conversation_history = await load_chat_context(
+            message.chat_id, message.message
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing message: {str(e)}") from e
+
+    async def event_stream() -> AsyncIterator[str]:
+        response_cache: ResponseCache = app.state.response_cache
+        try:
+            if cached:
+                response_text = cached["response"]
+                tools_used = cached["tools_used"]
+                yield format_sse({"token": response_text})
+            else:
+                tools_used = []
+                chunks = []
+                async for token in stream_agent(message.message, business_context, conversation_history, tools_used):
+                    chunks.append(token)
+                    yield format_sse({"token": token})
+                response_text = "".join(chunks)
+
+                response_cache.schedule_store(
+                    query_embedding, business_context, conversation_history, response_text, tools_used
+                )
+
+            await ConversationMemory(message.chat_id).add_message(message.message, response_text)
+            yield format_sse({"done": True, "tools_used": tools_used, "model_used": OPENAI_MODEL})
+
+        except Exception as e:
+            yield format_sse({"error": f"Error processing message: {str(e)}"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.get("/chat/{chat_id}/history")
-async def get_chat_history(chat_id: str, limit: int = 10) -> dict[str, Any]:
+async def get_chat_history(
+    chat_id: str, session: Annotated[AsyncSession, Depends(get_db)], limit: int = 10
+) -> dict[str, Any]:
     """Get conversation history for a specific chat."""
     try:
-        memory = ConversationMemory(chat_id)
-        history = memory.get_recent_messages(limit)
-        summary = memory.get_conversation_summary()
+        memory = ConversationMemory(chat_id, session)
+        history = await memory.get_recent_messages(limit)
+        summary = await memory.get_conversation_summary()
 
         return {
             "chat_id": chat_id,
@@ -205,11 +409,11 @@ async def get_chat_history(chat_id: str, limit: int = 10) -> dict[str, Any]:
 
 
 @app.delete("/chat/{chat_id}/history")
-async def clear_chat_history(chat_id: str) -> dict[str, Any]:
+async def clear_chat_history(chat_id: str, session: Annotated[AsyncSession, Depends(get_db)]) -> dict[str, Any]:
     """Clear conversation history for a specific chat."""
     try:
-        memory = ConversationMemory(chat_id)
-        deleted_count = memory.clear_history()
+        memory = ConversationMemory(chat_id, session)
+        deleted_count = await memory.clear_history()
 
         return {
             "chat_id": chat_id,
@@ -240,6 +444,7 @@ async def test_endpoint() -> dict[str, Any]:
 
 @app.post("/webhook/twilio")
 async def twilio_webhook(
+    session: Annotated[AsyncSession, Depends(get_db)],
     From: str = Form(...),
     Body: str = Form(...),
     MessageSid: str = Form(...),
@@ -250,6 +455,7 @@ async def twilio_webhook(
     Receives incoming WhatsApp messages from Twilio and responds with AI agent.
 
     Args:
+        session: Request-scoped database session
         From: Sender's WhatsApp number (e.g., whatsapp:+1234567890)
         Body: Message text content
         MessageSid: Unique message identifier from Twilio
@@ -261,35 +467,7 @@ async def twilio_webhook(
     try:
         chat_id = From.replace("whatsapp:", "").replace("+", "").strip()
 
-        memory = ConversationMemory(chat_id)
-        knowledge_store = BusinessKnowledgeStore()
-
-        conversation_history = memory.build_conversation_context(limit=5)
-        relevant_knowledge = knowledge_store.search_knowledge(Body, limit=3)
-        business_context = "\n".join([item["content"] for item in relevant_knowledge])
-
-        model_name = os.getenv("OPENAI_MODEL", "gpt-4o")
-
-        if model_name == "gpt-5-nano":
-            gpt5_agent = GPT5NanoAgent()
-            result = gpt5_agent.process_message(
-                Body, business_context=business_context, conversation_history=conversation_history
-            )
-            response_text = result["response"]
-        else:
-            agent_executor = create_agent()
-
-            agent_input = {
-                "input": Body,
-                "business_context": business_context,
-                "conversation_history": conversation_history,
-                "chat_history": [],
-            }
-
-            result = agent_executor.invoke(agent_input)
-            response_text = result["output"]
-
-        memory.add_message(Body, response_text)
+        response_text, _ = await process_chat_message(chat_id, Body, session=session)
 
         twiml_response = MessagingResponse()
         twiml_response.message(response_text)
@@ -305,8 +483,4 @@ async def twilio_webhook(
 if __name__ == "__main__":
     import uvicorn
 
-    print("🚀 Initializing database...")
-    init_database()
-    print("✅ Database ready!")
-
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,118 +1,165 @@
 """Conversation memory management for WhatsApp AI Agent."""
 
+import os
+from collections import OrderedDict, deque
+from contextlib import AbstractAsyncContextManager, nullcontext
 from typing import Any
 
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from database import Conversation, get_session
 
+CONTEXT_CACHE_TURNS = 5
+CONTEXT_CACHE_MAX_CHATS = int(os.getenv("CONTEXT_CACHE_MAX_CHATS", "10000"))
+
+# Most recent turns per chat, least recently used first. Only chats whose history has been loaded are
+# tracked, and add_message keeps them current, so a hit never needs to go back to the database.
+_recent_turns: OrderedDict[str, deque[dict[str, Any]]] = OrderedDict()
+
 
 class ConversationMemory:
     """Manages conversation history and context."""
 
-    def __init__(self, chat_id: str):
-        """Initialize conversation memory for a specific chat."""
+    def __init__(self, chat_id: str, session: AsyncSession | None = None):
+        """Initialize conversation memory for a specific chat.
+
+        Args:
+            chat_id: Conversation identifier
+            session: Request-scoped session to reuse; each call opens its own session when omitted
+        """
         self.chat_id = chat_id
+        self.session = session
+
+    def _session_scope(self) -> AbstractAsyncContextManager[AsyncSession]:
+        """Return the injected session, or a new session that is closed after use."""
+        return nullcontext(self.session) if self.session is not None else get_session()
 
-    def add_message(self, user_message: str, assistant_response: str) -> None:
+    async def add_message(self, user_message: str, assistant_response: str) -> None:
         """Store a conversation turn in the database."""
-        session = get_session()
-        try:
-            conversation = Conversation(
-                chat_id=self.chat_id,
-                user_message=user_message,
-                assistant_response=assistant_response,
+        async with self._session_scope() as session:
+            timestamp = await session.scalar(
+                insert(Conversation).returning(Conversation.timestamp),
+                {"chat_id": self.chat_id, "user_message": user_message, "assistant_response": assistant_response},
+            )
+            await session.commit()
+
+        turns = _recent_turns.get(self.chat_id)
+        if turns is not None:
+            turns.append(
+                {
+                    "user_message": user_message,
+                    "assistant_response": assistant_response,
+                    "timestamp": timestamp.isoformat(),
+                }
             )
-            session.add(conversation)
-            session.commit()
-        finally:
-            session.close()
 
-    def get_recent_messages(self, limit: int = 10) -> list[dict[str, Any]]:
+    async def get_recent_messages(self, limit: int = 10) -> list[dict[str, Any]]:
         """Retrieve recent conversation history."""
-        session = get_session()
-        try:
-            conversations = (
-                session.query(Conversation)
-                .filter(Conversation.chat_id == self.chat_id)
+        async with self._session_scope() as session:
+            result = await session.execute(
+                select(Conversation.user_message, Conversation.assistant_response, Conversation.timestamp)
+                .where(Conversation.chat_id == self.chat_id)
                 .order_by(Conversation.timestamp.desc())
                 .limit(limit)
-                .all()
             )
+            rows = result.all()
 
             return [
                 {
-                    "user_message": conv.user_message,
-                    "assistant_response": conv.assistant_response,
-                    "timestamp": conv.timestamp.isoformat(),
+                    "user_message": row.user_message,
+                    "assistant_response": row.assistant_response,
+                    "timestamp": row.timestamp.isoformat(),
                 }
-                for conv in reversed(conversations)
+                for row in reversed(rows)
             ]
-        finally:
-            session.close()
 
-    def build_conversation_context(self, limit: int = 5) -> str:
+    async def build_conversation_context(self, limit: int = 5) -> str:
         """Build conversation context string for the LLM."""
-        recent_messages = self.get_recent_messages(limit)
+        if limit > CONTEXT_CACHE_TURNS:
+            return format_conversation_context(await self.get_recent_messages(limit))
 
-        if not recent_messages:
-            return ""
+        recent_messages = get_cached_turns(self.chat_id)
+        if recent_messages is None:
+            recent_messages = await self.get_recent_messages(CONTEXT_CACHE_TURNS)
+            cache_turns(self.chat_id, recent_messages)
 
-        context = "Previous conversation:\n"
-        for msg in recent_messages:
-            context += f"User: {msg['user_message']}\n"
-            if msg["assistant_response"]:
-                context += f"Assistant: {msg['assistant_response']}\n"
+        return format_conversation_context(recent_messages[-limit:] if limit > 0 else [])
 
-        return context
-
-    def get_conversation_summary(self) -> dict[str, Any]:
+    async def get_conversation_summary(self) -> dict[str, Any]:
         """Get conversation statistics and summary."""
-        session = get_session()
-        try:
-            total_messages = session.query(Conversation).filter(Conversation.chat_id == self.chat_id).count()
-
-            latest_message = (
-                session.query(Conversation)
-                .filter(Conversation.chat_id == self.chat_id)
-                .order_by(Conversation.timestamp.desc())
-                .first()
+        async with self._session_scope() as session:
+            result = await session.execute(
+                select(func.count(Conversation.id), func.max(Conversation.timestamp)).where(
+                    Conversation.chat_id == self.chat_id
+                )
             )
+            total_messages, latest_timestamp = result.one()
 
             return {
                 "chat_id": self.chat_id,
                 "total_messages": total_messages,
-                "latest_timestamp": (latest_message.timestamp.isoformat() if latest_message else None),
+                "latest_timestamp": latest_timestamp.isoformat() if latest_timestamp else None,
                 "has_history": total_messages > 0,
             }
-        finally:
-            session.close()
 
-    def clear_history(self) -> int:
+    async def clear_history(self) -> int:
         """Clear conversation history for this chat."""
-        session = get_session()
-        try:
-            deleted_count = session.query(Conversation).filter(Conversation.chat_id == self.chat_id).delete()
-            session.commit()
-            return deleted_count
-        finally:
-            session.close()
-
-
-def get_all_active_chats() -> list[dict[str, Any]]:
-    """Get list of all active chats with recent activity."""
-    session = get_session()
-    try:
-        from sqlalchemy import func
-
-        active_chats = (
-            session.query(
+        async with self._session_scope() as session:
+            result = await session.execute(delete(Conversation).where(Conversation.chat_id == self.chat_id))
+            await session.commit()
+            _recent_turns.pop(self.chat_id, None)
+            return result.rowcount
+
+
+def format_conversation_context(recent_messages: list[dict[str, Any]]) -> str:
+    """Format recent messages, oldest first, as a conversation context string for the LLM."""
+    if not recent_messages:
+        return ""
+
+    lines = ["Previous conversation:\n"]
+    for msg in recent_messages:
+        lines.append(f"User: {msg['user_message']}\n")
+        if msg["assistant_response"]:
+            lines.append(f"Assistant: {msg['assistant_response']}\n")
+
+    return "".join(lines)
+
+
+def get_cached_turns(chat_id: str) -> list[dict[str, Any]] | None:
+    """Return the cached recent turns for a chat, oldest first, or None if the chat is not cached."""
+    turns = _recent_turns.get(chat_id)
+    if turns is None:
+        return None
+    _recent_turns.move_to_end(chat_id)
+    return list(turns)
+
+
+def cache_turns(chat_id: str, recent_messages: list[dict[str, Any]]) -> None:
+    """Cache the latest turns of a chat loaded from the database, evicting the least recently used chats."""
+    _recent_turns[chat_id] = deque(recent_messages[-CONTEXT_CACHE_TURNS:], maxlen=CONTEXT_CACHE_TURNS)
+    _recent_turns.move_to_end(chat_id)
+    while len(_recent_turns) > CONTEXT_CACHE_MAX_CHATS:
+        _recent_turns.popitem(last=False)
+
+
+async def get_all_active_chats() -> list[dict[str, Any]]:
+    """Get list of all active chats with recent activity.
+
+    Only ``chat_id`` and ``timestamp`` are read, so PostgreSQL can aggregate with an index-only scan
+    over ``ix_conversations_chat_ts`` instead of reading every row from the table.
+    """
+    async with get_session() as session:
+        result = await session.execute(
+            select(
                 Conversation.chat_id,
-                func.count(Conversation.id).label("message_count"),
+                func.count().label("message_count"),
                 func.max(Conversation.timestamp).label("last_activity"),
             )
             .group_by(Conversation.chat_id)
             .order_by(func.max(Conversation.timestamp).desc())
-            .all()
         )
+        active_chats = result.all()
 
         return [
             {
@@ -122,5 +169,3 @@ def get_all_active_chats() -> list[dict[str, Any]]:
             }
             for chat in active_chats
         ]
-    finally:
-        session.close()
@@ -0,0 +1,109 @@
+"""Semantic response cache for WhatsApp AI Agent."""
+
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import delete, select
+
+from database import CachedResponse, get_session
+from tools import list_available_properties
+
+# Answers built from these tools can be reused: their output depends on neither arguments nor the current date
+CACHEABLE_TOOLS = frozenset({list_available_properties.name})
+
+
+def context_hash(business_context: str) -> str:
+    """Hash the business context a response was generated with."""
+    return hashlib.sha256(business_context.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Serves stored agent responses for semantically similar opening messages.
+
+    Only messages without conversation history are cached: a follow-up depends on the turns before it,
+    and a history-scoped key would change on every turn and never be hit again.
+    """
+
+    def __init__(self):
+        """Initialize the response cache from environment settings."""
+        self.similarity_threshold = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.92"))
+        self.ttl = timedelta(seconds=int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400")))
+        self._pending: set[asyncio.Task[None]] = set()
+
+    async def lookup(
+        self, query_embedding: list[float], business_context: str, conversation_history: str
+    ) -> dict[str, Any] | None:
+        """Return the closest cached response above the similarity threshold, if any.
+
+        Candidates are narrowed to the same business context through the ``context_hash`` index
+        before distances are computed, so entries from other contexts cannot crowd out a hit.
+        """
+        if conversation_history:
+            return None
+
+        distance = CachedResponse.embedding.cosine_distance(query_embedding)
+
+        async with get_session() as session:
+            result = await session.execute(
+                select(CachedResponse.response, CachedResponse.tools_used)
+                .where(CachedResponse.context_hash == context_hash(business_context))
+                .where(CachedResponse.expires_at > datetime.utcnow())
+                .where(distance < 1 - self.similarity_threshold)
+                .order_by(distance)
+                .limit(1)
+            )
+            row = result.first()
+
+        if row is None:
+            return None
+        return {"response": row.response, "tools_used": row.tools_used or []}
+
+    def schedule_store(
+        self,
+        query_embedding: list[float],
+        business_context: str,
+        conversation_history: str,
+        response: str,
+        tools_used: list[str],
+    ) -> bool:
+        """Cache a response in the background so the reply is not delayed by the write.
+
+        Returns:
+            True if the response is cacheable and a write was scheduled
+        """
+        if conversation_history or not CACHEABLE_TOOLS.issuperset(tools_used):
+            return False
+
+        task = asyncio.create_task(self.store(query_embedding, business_context, response, tools_used))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return True
+
+    async def store(
+        self, query_embedding: list[float], business_context: str, response: str, tools_used: list[str]
+    ) -> None:
+        """Insert a cache entry and prune expired ones."""
+        now = datetime.utcnow()
+        try:
+            async with get_session() as session:
+                await session.execute(delete(CachedResponse).where(CachedResponse.expires_at <= now))
+                session.add(
+                    CachedResponse(
+                        embedding=query_embedding,
+                        context_hash=context_hash(business_context),
+                        response=response,
+                        tools_used=tools_used,
+                        created_at=now,
+                        expires_at=now + self.ttl,
+                    )
+                )
+                await session.commit()
+        except Exception as e:
+            print(f"⚠️ Could not cache response: {e}")
+
+    async def aclose(self) -> None:
+        """Wait for scheduled cache writes to finish."""
+        await asyncio.gather(*self._pending, return_exceptions=True)
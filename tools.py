@@ -1,10 +1,62 @@
 """Tools for the WhatsApp AI Agent."""
 
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Any
 
+import numpy as np
 from langchain.tools import tool
 
+PROPERTY_AVAILABILITY: dict[str, dict[str, Any]] = {
+    "miami_beach_01": {
+        "name": "Ocean View Apartment - Miami Beach",
+        "base_price": 150,
+        "available_dates": frozenset({"2024-03-15", "2024-03-16", "2024-03-17", "2024-03-20", "2024-03-25"}),
+    },
+    "downtown_02": {
+        "name": "Downtown Miami Loft",
+        "base_price": 120,
+        "available_dates": frozenset({"2024-03-18", "2024-03-19", "2024-03-22", "2024-03-23", "2024-03-24"}),
+    },
+    "brickell_03": {
+        "name": "Brickell High-Rise Condo",
+        "base_price": 200,
+        "available_dates": frozenset({"2024-03-15", "2024-03-16", "2024-03-21", "2024-03-22", "2024-03-26"}),
+    },
+}
+
+PROPERTY_DETAILS: dict[str, dict[str, Any]] = {
+    "miami_beach_01": {
+        "name": "Ocean View Apartment - Miami Beach",
+        "description": "Stunning 2BR/2BA apartment with direct ocean views",
+        "amenities": ["Ocean view", "WiFi", "Kitchen", "Parking", "Pool", "Gym"],
+        "capacity": "4 guests",
+        "location": "Miami Beach, FL",
+        "check_in": "3:00 PM",
+        "check_out": "11:00 AM",
+        "base_price": 150,
+    },
+    "downtown_02": {
+        "name": "Downtown Miami Loft",
+        "description": "Modern loft in the heart of downtown Miami",
+        "amenities": ["City view", "WiFi", "Kitchen", "Parking", "Rooftop terrace"],
+        "capacity": "2 guests",
+        "location": "Downtown Miami, FL",
+        "check_in": "3:00 PM",
+        "check_out": "11:00 AM",
+        "base_price": 120,
+    },
+    "brickell_03": {
+        "name": "Brickell High-Rise Condo",
+        "description": "Luxury condo with bay views in Brickell",
+        "amenities": ["Bay view", "WiFi", "Kitchen", "Parking", "Pool", "Spa", "Concierge"],
+        "capacity": "6 guests",
+        "location": "Brickell, Miami, FL",
+        "check_in": "4:00 PM",
+        "check_out": "11:00 AM",
+        "base_price": 200,
+    },
+}
+
 
 @tool
 def check_property_availability(property_id: str, check_in: str, check_out: str) -> str:
@@ -18,29 +70,11 @@ def check_property_availability(property_id: str, check_in: str, check_out: str)
     Returns:
         Availability status and pricing information
     """
-    dummy_properties: dict[str, dict[str, Any]] = {
-        "miami_beach_01": {
-            "name": "Ocean View Apartment - Miami Beach",
-            "base_price": 150,
-            "available_dates": ["2024-03-15", "2024-03-16", "2024-03-17", "2024-03-20", "2024-03-25"],
-        },
-        "downtown_02": {
-            "name": "Downtown Miami Loft",
-            "base_price": 120,
-            "available_dates": ["2024-03-18", "2024-03-19", "2024-03-22", "2024-03-23", "2024-03-24"],
-        },
-        "brickell_03": {
-            "name": "Brickell High-Rise Condo",
-            "base_price": 200,
-            "available_dates": ["2024-03-15", "2024-03-16", "2024-03-21", "2024-03-22", "2024-03-26"],
-        },
-    }
-
-    if property_id not in dummy_properties:
-        available_props = ", ".join(dummy_properties.keys())
+    if property_id not in PROPERTY_AVAILABILITY:
+        available_props = ", ".join(PROPERTY_AVAILABILITY.keys())
         return f"Property {property_id} not found. Available properties: {available_props}"
 
-    property_info = dummy_properties[property_id]
+    property_info = PROPERTY_AVAILABILITY[property_id]
 
     try:
         check_in_date = datetime.strptime(check_in, "%Y-%m-%d")
@@ -50,15 +84,10 @@ def check_property_availability(property_id: str, check_in: str, check_out: str)
             return "Check-in date must be before check-out date."
 
         nights = (check_out_date - check_in_date).days
-        current_date = check_in_date
-        available_nights = []
-
-        while current_date < check_out_date:
-            date_str = current_date.strftime("%Y-%m-%d")
-            available_dates = property_info["available_dates"]
-            if date_str in available_dates:
-                available_nights.append(date_str)
-            current_date += timedelta(days=1)
+        requested_nights = np.arange(
+            np.datetime64(check_in_date.date(), "D"), np.datetime64(check_out_date.date(), "D")
+        ).astype(str)
+        available_nights = property_info["available_dates"].intersection(requested_nights.tolist())
 
         if len(available_nights) == nights:
             base_price = int(property_info["base_price"])
@@ -89,44 +118,11 @@ def get_property_details(property_id: str) -> str:
     Returns:
         Detailed property information
     """
-    dummy_properties: dict[str, dict[str, Any]] = {
-        "miami_beach_01": {
-            "name": "Ocean View Apartment - Miami Beach",
-            "description": "Stunning 2BR/2BA apartment with direct ocean views",
-            "amenities": ["Ocean view", "WiFi", "Kitchen", "Parking", "Pool", "Gym"],
-            "capacity": "4 guests",
-            "location": "Miami Beach, FL",
-            "check_in": "3:00 PM",
-            "check_out": "11:00 AM",
-            "base_price": 150,
-        },
-        "downtown_02": {
-            "name": "Downtown Miami Loft",
-            "description": "Modern loft in the heart of downtown Miami",
-            "amenities": ["City view", "WiFi", "Kitchen", "Parking", "Rooftop terrace"],
-            "capacity": "2 guests",
-            "location": "Downtown Miami, FL",
-            "check_in": "3:00 PM",
-            "check_out": "11:00 AM",
-            "base_price": 120,
-        },
-        "brickell_03": {
-            "name": "Brickell High-Rise Condo",
-            "description": "Luxury condo with bay views in Brickell",
-            "amenities": ["Bay view", "WiFi", "Kitchen", "Parking", "Pool", "Spa", "Concierge"],
-            "capacity": "6 guests",
-            "location": "Brickell, Miami, FL",
-            "check_in": "4:00 PM",
-            "check_out": "11:00 AM",
-            "base_price": 200,
-        },
-    }
-
-    if property_id not in dummy_properties:
-        available_props = ", ".join(dummy_properties.keys())
+    if property_id not in PROPERTY_DETAILS:
+        available_props = ", ".join(PROPERTY_DETAILS.keys())
         return f"Property {property_id} not found. Available properties: {available_props}"
 
-    prop = dummy_properties[property_id]
+    prop = PROPERTY_DETAILS[property_id]
     amenities_list = list(prop["amenities"])
     return f"""🏠 {prop['name']}
 📍 Location: {prop['location']}
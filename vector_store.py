@@ -3,10 +3,11 @@
 import os
 from typing import Any
 
-from langchain_openai import OpenAIEmbeddings
-from sqlalchemy import text
+from sqlalchemy import insert, select, text
+from sqlalchemy.schema import CreateIndex
 
-from database import BusinessKnowledge, get_database_url, get_session
+from database import BusinessKnowledge, configure_vector_search, default_ef_search, get_database_url, get_session
+from llm import EmbedBatcher, get_embeddings
 
 
 class BusinessKnowledgeStore:
@@ -15,82 +16,121 @@ class BusinessKnowledgeStore:
     def __init__(self):
         """Initialize the business knowledge store."""
         embedding_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
-        self.embeddings = OpenAIEmbeddings(model=embedding_model)
+        self.embeddings = get_embeddings(embedding_model)
+        self.embed_batcher = EmbedBatcher(self.embeddings)
         self.database_url = get_database_url()
 
-    def add_knowledge(self, content: str, metadata: dict[str, Any] | None = None) -> None:
+    async def add_knowledge(self, content: str, metadata: dict[str, Any] | None = None) -> None:
         """Add business knowledge to the vector store."""
-        session = get_session()
-        try:
-            embedding = self.embeddings.embed_query(content)
-
-            knowledge = BusinessKnowledge(content=content, embedding=embedding, meta_data=metadata or {})
-
-            session.add(knowledge)
-            session.commit()
-        finally:
-            session.close()
-
-    def search_knowledge(self, query: str, limit: int = 5) -> list[dict[str, Any]]:
-        """Search for relevant business knowledge."""
-        session = get_session()
-        try:
-            query_embedding = self.embeddings.embed_query(query)
-
-            results = (
-                session.query(BusinessKnowledge)
-                .order_by(BusinessKnowledge.embedding.cosine_distance(query_embedding))
+        await self.add_knowledge_many([{"content": content, "metadata": metadata}])
+
+    async def add_knowledge_many(self, items: list[dict[str, Any]]) -> int:
+        """Add several knowledge entries with one embeddings call and one bulk insert.
+
+        Args:
+            items: Dicts with ``content`` and optional ``metadata`` keys
+
+        Returns:
+            Number of entries inserted
+        """
+        if not items:
+            return 0
+
+        embeddings = await self.embeddings.aembed_documents([item["content"] for item in items])
+
+        async with get_session() as session:
+            await session.execute(
+                insert(BusinessKnowledge),
+                [
+                    {"content": item["content"], "embedding": embedding, "meta_data": item.get("metadata") or {}}
+                    for item, embedding in zip(items, embeddings, strict=True)
+                ],
+            )
+            await session.commit()
+        return len(items)
+
+    async def search_knowledge(
+        self,
+        query: str,
+        limit: int = 5,
+        query_embedding: list[float] | None = None,
+        max_distance: float | None = None,
+        ef_search: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """Search for relevant business knowledge.
+
+        Args:
+            query: Text to search for
+            limit: Maximum number of results
+            query_embedding: Precomputed embedding of ``query``, to avoid embedding it twice
+            max_distance: Optional cosine distance cutoff; farther results are dropped
+            ef_search: HNSW candidate list size; defaults to a value suited to ``limit``
+        """
+        if query_embedding is None:
+            query_embedding = await self.embed_batcher.embed(query)
+
+        distance = BusinessKnowledge.embedding.cosine_distance(query_embedding).label("distance")
+
+        async with get_session() as session:
+            await configure_vector_search(session, ef_search or default_ef_search(limit))
+            result = await session.execute(
+                select(BusinessKnowledge.content, BusinessKnowledge.meta_data, distance)
+                .where(BusinessKnowledge.embedding.is_not(None))
+                .order_by(distance)
                 .limit(limit)
-                .all()
             )
-
-            return [
-                {
-                    "content": result.content,
-                    "metadata": result.meta_data,
-                    "similarity": 1.0,
-                }
-                for result in results
-            ]
-        finally:
-            session.close()
-
-    def setup_vector_extension(self) -> bool:
+            rows = result.all()
+
+        return [
+            {
+                "content": row.content,
+                "metadata": row.meta_data,
+                "similarity": 1.0 - row.distance,
+            }
+            for row in rows
+            if max_distance is None or row.distance < max_distance
+        ]
+
+    async def setup_vector_extension(self) -> bool:
         """Ensure pgvector extension is enabled."""
-        session = get_session()
-        try:
-            session.execute(text("CREATE EXTENSION IF NOT EXISTS vector;"))
-            session.commit()
-            return True
-        except Exception as e:
-            print(f"Error setting up vector extension: {e}")
-            return False
-        finally:
-            session.close()
-
-    def create_vector_index(self) -> bool:
-        """Create vector index for better performance."""
-        session = get_session()
-        try:
-            session.execute(
-                text(
-                    """
-                CREATE INDEX IF NOT EXISTS business_knowledge_embedding_idx 
-                ON business_knowledge USING ivfflat (embedding vector_cosine_ops)
-                WITH (lists = 100);
-                """
+        async with get_session() as session:
+            try:
+                await session.execute(text("CREATE EXTENSION IF NOT EXISTS vector;"))
+                await session.commit()
+                return True
+            except Exception as e:
+                print(f"Error setting up vector extension: {e}")
+                return False
+
+    async def create_vector_index(self) -> bool:
+        """Create the HNSW vector index, migrating legacy vector columns and IVFFlat indexes."""
+        async with get_session() as session:
+            try:
+                await session.execute(text("DROP INDEX IF EXISTS business_knowledge_embedding_idx;"))
+                embedding_type = await session.scalar(
+                    text(
+                        "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+                        "WHERE attrelid = 'business_knowledge'::regclass AND attname = 'embedding'"
+                    )
                 )
-            )
-            session.commit()
-            return True
-        except Exception as e:
-            print(f"Error creating vector index: {e}")
-            return False
-        finally:
-            session.close()
-
-
-def init_sample_knowledge():
+                if embedding_type == "vector(1536)":
+                    await session.execute(text("DROP INDEX IF EXISTS business_knowledge_embedding_hnsw_idx;"))
+                    await session.execute(
+                        text(
+                            "ALTER TABLE business_knowledge "
+                            "ALTER COLUMN embedding TYPE halfvec(1536) USING embedding::halfvec(1536);"
+                        )
+                    )
+                for index in BusinessKnowledge.__table__.indexes:
+                    await session.execute(CreateIndex(index, if_not_exists=True))
+                await session.commit()
+                return True
+            except Exception as e:
+                print(f"Error creating vector index: {e}")
+                return False
+
+
+async def init_sample_knowledge():
     """Initialize with sample business knowledge."""
     store = BusinessKnowledgeStore()
 
@@ -167,7 +207,6 @@ def init_sample_knowledge():
         },
     ]
 
-    for knowledge in sample_knowledge:
-        store.add_knowledge(knowledge["content"], knowledge["metadata"])
+    await store.add_knowledge_many(sample_knowledge)
 
     print("Sample business knowledge added successfully!")